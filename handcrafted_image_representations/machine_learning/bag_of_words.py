@@ -27,6 +27,20 @@ def remove_empty_desc(descriptors):
     return descriptors_out
 
 
+def as_center_dtype(descriptors, k_means_clustering):
+    """
+    Casts descriptors to the dtype of the cluster centers before predicting visual words,
+    models saved before the switch to float32 descriptors hold float64 cluster centers
+    Args:
+        descriptors: descriptor set of one image
+        k_means_clustering: fitted clustering
+
+    Returns:
+        descriptors with the dtype of the cluster centers, not copied if it already matches
+    """
+    return np.asarray(descriptors, dtype=k_means_clustering.cluster_centers_.dtype)
+
+
 class BagOfWords:
     def __init__(self, n_words=100, cluster_method="MiniBatchKMeans", normalize=False, tf_idf=False):
 
@@ -95,7 +109,7 @@ class BagOfWords:
         self.k_means_clustering = self._init_cluster_method(self.cluster_method)
         descriptors = remove_empty_desc(descriptors)
         all_descriptors = np.concatenate(descriptors, axis=0)
-        all_descriptors = all_descriptors.astype("double")
+        all_descriptors = all_descriptors.astype(np.float32, copy=False)
         logging.info("Fitting Bag of Words (n_words={}) to feature space...".format(self.n_words))
         logging.info("Feature Vectors to be fitted: {}".format(all_descriptors.shape[0]))
         logging.info("Each Vector with {} features".format(all_descriptors.shape[1]))
@@ -115,9 +129,8 @@ class BagOfWords:
     def _bag_up_descriptors(self, descriptors):
         word_bag = np.zeros((1, self.n_words))
         if descriptors is not None:
-            words = self.k_means_clustering.predict(descriptors.astype("double"))
-            for word in words:
-                word_bag[0, word] += 1
+            words = self.k_means_clustering.predict(as_center_dtype(descriptors, self.k_means_clustering))
+            word_bag[0] = np.bincount(words, minlength=self.n_words)
         if self.parameters["tf_idf"]:
             return word_bag * self.tf_idf_word_counts
         return word_bag
@@ -18,6 +18,7 @@ class BestOfHandcraftedFeatures:
                  image_size={"width": 128, "height": 128},
                  clf_type=["rf_100", "mlp"],
                  data_split_mode="random",
+                 search="grid",
                  ):
         
         self.opt = {
@@ -30,6 +31,7 @@ class BestOfHandcraftedFeatures:
             "clf_type": clf_type,
             "image_size": image_size,
             "data_split_mode": data_split_mode,
+            "search": search,
         }
 
         self.class_mapping = class_mapping
@@ -6,7 +6,7 @@ import logging
 
 from sklearn.svm import SVC
 from sklearn.gaussian_process import GaussianProcessClassifier, kernels
-from sklearn.linear_model import LogisticRegressionCV, LogisticRegression
+from sklearn.linear_model import LogisticRegressionCV, LogisticRegression, SGDClassifier
 from sklearn.ensemble import RandomForestClassifier, HistGradientBoostingClassifier
 from sklearn.neural_network import MLPClassifier
 from sklearn.neighbors import KNeighborsClassifier, NearestCentroid
@@ -14,22 +14,36 @@ from sklearn.neighbors import KNeighborsClassifier, NearestCentroid
 from sklearn.metrics import classification_report
 from sklearn.metrics import confusion_matrix
 from sklearn.metrics import f1_score
+from sklearn.utils.class_weight import compute_sample_weight
 
-from handcrafted_image_representations.utils.utils import check_n_make_dir, save_dict, load_dict
+from handcrafted_image_representations.utils.utils import check_n_make_dir, save_dict, load_dict, save_model
+
+
+# Above this number of training samples the kernel SVM is replaced by a linear one
+LARGE_DATA_SET_SIZE = 20000
+
+# Estimators that are fitted with balanced sample weights
+BALANCED_CLASSIFIERS = (
+    RandomForestClassifier,
+    HistGradientBoostingClassifier,
+    LogisticRegression,
+    SGDClassifier,
+    SVC,
+)
 
 
 def init_ensembles(clf_type):
     if clf_type == "rf_100":
-        return RandomForestClassifier(n_estimators=100, class_weight="balanced", n_jobs=-1)
+        return RandomForestClassifier(n_estimators=100, n_jobs=-1)
     elif clf_type == "rf_200":
-        return RandomForestClassifier(n_estimators=200, class_weight="balanced", n_jobs=-1)
+        return RandomForestClassifier(n_estimators=200, n_jobs=-1)
     elif clf_type == "rf_500":
-        return RandomForestClassifier(n_estimators=500, class_weight="balanced", n_jobs=-1)
+        return RandomForestClassifier(n_estimators=500, n_jobs=-1)
     elif clf_type == "rf_1000":
-        return RandomForestClassifier(n_estimators=1000, class_weight="balanced", n_jobs=-1)
+        return RandomForestClassifier(n_estimators=1000, n_jobs=-1)
     elif clf_type == "rf_2000":
-        return RandomForestClassifier(n_estimators=2000, class_weight="balanced", n_jobs=-1)
-    return RandomForestClassifier(n_estimators=200, class_weight="balanced", n_jobs=-1)
+        return RandomForestClassifier(n_estimators=2000, n_jobs=-1)
+    return RandomForestClassifier(n_estimators=200, n_jobs=-1)
 
 
 def init_knn(clf_type):
@@ -57,21 +71,27 @@ def init_mlp(clf_type):
     return MLPClassifier(max_iter=max_iter)
 
 
-def init_other(clf_type):
+def init_other(clf_type, n_samples=None):
+    is_large = n_samples is not None and n_samples > LARGE_DATA_SET_SIZE
     if clf_type == "gp":
         return GaussianProcessClassifier((1.0 * kernels.RBF(1.0)), n_jobs=-1)
-    elif clf_type == "lr":
-        return LogisticRegression(class_weight='balanced', max_iter=10000)
-    elif clf_type == "lr_cv":
-        return LogisticRegression(class_weight='balanced', max_iter=10000)
+    elif clf_type in ["lr", "lr_cv"]:
+        return LogisticRegression(max_iter=10000)
     elif clf_type == "svm":
-        return SVC(kernel='rbf', class_weight='balanced', gamma="scale")
+        if is_large:
+            return SGDClassifier(loss="hinge", max_iter=10000, n_jobs=-1)
+        return SVC(kernel='rbf', gamma="scale")
     elif clf_type == "nc":
         return NearestCentroid()
     raise Exception("Unknown Classifier Option: {}.".format(clf_type))
 
 
-def init_classifier(opt):
+def init_classifier(opt, n_samples=None):
+    """
+    Args:
+        opt: options holding the clf_type
+        n_samples: size of the training set, large sets switch svm to a linear solver
+    """
     if "rf" in opt["clf_type"]:
         return init_ensembles(opt["clf_type"])
     elif "mlp" in opt["clf_type"]:
@@ -79,9 +99,9 @@ def init_classifier(opt):
     elif "knn" in opt["clf_type"]:
         return init_knn(opt["clf_type"])
     elif "hgb" in opt["clf_type"]:
-        return HistGradientBoostingClassifier(class_weight="balanced")
+        return HistGradientBoostingClassifier()
     else:
-        return init_other(opt["clf_type"])
+        return init_other(opt["clf_type"], n_samples)
 
 
 class Classifier:
@@ -95,25 +115,47 @@ class Classifier:
     def __str__(self):
         return "Classifier: {}".format(self.opt["clf_type"])
 
-    def fit(self, x_train, y_train):
-        self.new()
+    def fit(self, x_train, y_train, sample_weight=None, n_samples=None):
+        """
+        Args:
+            x_train: training features
+            y_train: training labels
+            sample_weight: balanced weights of y_train, computed if not given.
+                Pass them in when fitting several classifiers on the same labels
+            n_samples: size of the full training set, defaults to len(x_train).
+                Pass it in when fitting on a subset, so the same estimator is chosen as for the full set
+        """
+        if n_samples is None:
+            n_samples = len(x_train)
+        self.new(n_samples=n_samples)
         logging.info("Fitting the {} to the training set".format(self.opt["clf_type"]))
         t0 = time()
-        self.classifier.fit(x_train, y_train)
+        if isinstance(self.classifier, BALANCED_CLASSIFIERS):
+            if sample_weight is None:
+                sample_weight = compute_sample_weight("balanced", y_train)
+            self.classifier.fit(x_train, y_train, sample_weight=sample_weight)
+        else:
+            self.classifier.fit(x_train, y_train)
         logging.info("done in %0.3fs" % (time() - t0))
 
     def predict(self, x, get_confidence=False):
         if get_confidence:
-            if self.opt["clf_type"] in ["nc", "svm"]:
-                return self.classifier.predict(x), 1.0
+            if not hasattr(self.classifier, "predict_proba"):
+                y_pred = self.classifier.predict(x)
+                return y_pred, np.ones(len(y_pred))
             prob = self.classifier.predict_proba(x)
-            return [np.argmax(prob)], np.max(prob)
+            return self.classifier.classes_[prob.argmax(axis=1)], prob.max(axis=1)
         return self.classifier.predict(x)
 
+    def predict_in_batches(self, x, batch_size=8192):
+        if len(x) <= batch_size:
+            return self.predict(x)
+        return np.concatenate([self.predict(x[i:i + batch_size]) for i in range(0, len(x), batch_size)], axis=0)
+
     def evaluate(self, x_test, y_test, save_path=None, print_results=True):
         logging.info("Predicting on the test set")
         t0 = time()
-        y_pred = self.predict(x_test)
+        y_pred = self.predict_in_batches(x_test)
         logging.info("done in %0.3fs" % (time() - t0))
 
         s = ""
@@ -131,8 +173,8 @@ class Classifier:
 
         return f1_score(y_true=y_test, y_pred=y_pred, average="macro")
 
-    def new(self):
-        self.classifier = init_classifier(self.opt)
+    def new(self, n_samples=None):
+        self.classifier = init_classifier(self.opt, n_samples)
 
     def load(self, model_path):
         path_to_class_mapping = os.path.join(model_path, "class_mapping.json")
@@ -153,4 +195,4 @@ class Classifier:
         save_dict(self.class_mapping, path_to_class_mapping)
         save_dict(self.opt, path_to_pipeline_opt)
         if self.classifier is not None:
-            joblib.dump(self.classifier, path_to_classifier)
+            save_model(self.classifier, path_to_classifier)
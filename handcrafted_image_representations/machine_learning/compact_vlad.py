@@ -7,7 +7,7 @@ from sklearn.cluster import MiniBatchKMeans, KMeans
 import json
 import joblib
 
-from handcrafted_image_representations.machine_learning.bag_of_words import remove_empty_desc
+from handcrafted_image_representations.machine_learning.bag_of_words import remove_empty_desc, as_center_dtype
 from handcrafted_image_representations.utils.utils import check_n_make_dir
 
 
@@ -73,7 +73,7 @@ class CompactVLAD:
         logging.info("Each Vector with {} features".format(descriptors.shape[1]))
         self.parameters["n_features"] = descriptors.shape[1]
         t0 = time()
-        self.k_means_clustering.fit(descriptors.astype("double"))
+        self.k_means_clustering.fit(descriptors)
         logging.info("done in %0.3fs" % (time() - t0))
 
     def partial_fit(self, descriptors):
@@ -106,17 +106,17 @@ class CompactVLAD:
         if len(descriptors.shape) ==1:
             descriptors = descriptors.reshape((1, -1))
         
-        descriptors = np.array(descriptors, dtype=np.float64)
         visual_words = self.k_means_clustering.cluster_centers_
+        descriptors = as_center_dtype(descriptors, self.k_means_clustering)
 
         # Step 2: Vector Quantization (Compute residuals)
         labels = self.k_means_clustering.predict(descriptors)
-        residuals = [descriptors[i] - visual_words[labels[i]] for i in range(len(descriptors))]
+        residuals = descriptors - visual_words[labels]
 
-        # Step 3: Aggregation (Sum residuals to get VLAD representation)
-        vlad_representation = np.zeros(self.n_words)
-        for i in range(len(residuals)):
-            vlad_representation[labels[i]] += np.linalg.norm(residuals[i])
+        # Step 3: Aggregation (Sum residual norms to get VLAD representation)
+        vlad_representation = np.bincount(
+            labels, weights=np.linalg.norm(residuals, axis=1), minlength=self.n_words
+        ).astype(np.float64)
 
         # L2-normalization
         vlad_representation = vlad_representation.flatten()
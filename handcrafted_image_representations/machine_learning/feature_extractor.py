@@ -1,5 +1,6 @@
 import cv2
 import numpy as np
+from joblib import Parallel, delayed
 from tqdm import tqdm
 
 from handcrafted_image_representations.machine_learning.descriptor_set import DescriptorSet
@@ -7,12 +8,12 @@ from handcrafted_image_representations.machine_learning.key_point_set import Key
 
 
 def validate_feature_extraction_settings(sampling_method, features_to_use):
-    if sampling_method not in ["kaze", "akaze"] and "kaze" in features_to_use:
+    if sampling_method not in ["kaze", "akaze"] and any("kaze" in f for f in features_to_use):
         print("[WARNING] Features KAZE are only compatible with KAZE key points")
         print("[WARNING] Sampling Method was changed to - kaze -")
         return "kaze", features_to_use
 
-    if sampling_method == "sift" and "sift" not in features_to_use:
+    if sampling_method == "sift" and not any("sift" in f for f in features_to_use):
         print("[WARNING] Sampling Method SIFT is only compatible with SIFT features")
         print("[WARNING] Sampling Method was changed to - kaze -")
         return "kaze", features_to_use
@@ -29,21 +30,28 @@ class FeatureExtractor:
                  image_height=None,
                  image_width=None,
                  resize_option="standard",
+                 n_jobs=-1,
                  ):
 
-        sampling_method, features_to_use = validate_feature_extraction_settings(sampling_method, features_to_use)
-        if type(features_to_use) is not list():
+        if not isinstance(features_to_use, (list, tuple)):
             features_to_use = [features_to_use]
+        features_to_use = list(features_to_use)
+        assert all(isinstance(f, str) for f in features_to_use), "Features have to be given by name"
+        sampling_method, features_to_use = validate_feature_extraction_settings(sampling_method, features_to_use)
         self.features_to_use = features_to_use
         self.normalize = normalize
         self.sampling_method = sampling_method
         self.sampling_steps = sampling_steps
         self.sampling_window = sampling_window
         self.resize_option = resize_option
+        self.n_jobs = n_jobs
 
         self.img_height = image_height
         self.img_width = image_width
 
+        self.kp_set = KeyPointSet(self.sampling_method, self.sampling_steps, self.sampling_window)
+        self.dc_sets = [DescriptorSet(feature) for feature in self.features_to_use]
+
     def describe_sampling(self):
         if self.sampling_method == "dense":
             return "{} - IMG:{}/{} DENSE: W:{}/S:{}".format(
@@ -67,50 +75,61 @@ class FeatureExtractor:
         
         o_height, o_width = image.shape[:2]
 
-        if height < 1 or width < 1:
-            height = int(o_height * height)
-            width = int(o_width * width)
-            return cv2.resize(
-                image,
-                (int(width), int(height)),
-                interpolation=cv2.INTER_CUBIC
-            )
-        
         if height is None:
             height = int(o_height * (width / o_width))
-        if width is None:
+        elif width is None:
             width = int(o_width * (height / o_height))
-        return cv2.resize(
-            image,
-            (int(width), int(height)),
-            interpolation=cv2.INTER_CUBIC
-        )
+        elif height < 1 or width < 1:
+            height = int(o_height * height)
+            width = int(o_width * width)
+
+        height, width = int(height), int(width)
+        if height == o_height and width == o_width:
+            return image
+        # INTER_AREA avoids aliasing when shrinking and is faster than INTER_CUBIC
+        if height < o_height or width < o_width:
+            interpolation = cv2.INTER_AREA
+        else:
+            interpolation = cv2.INTER_CUBIC
+        return cv2.resize(image, (width, height), interpolation=interpolation)
+
+    def fit(self, tags, y=None):
+        return self
+
+    def transform(self, tags):
+        x, _ = self.extract_trainings_data(tags)
+        return x
+
+    def fit_transform(self, tags, y=None):
+        return self.fit(tags, y).transform(tags)
+
+    def _process_tag(self, tag):
+        tag_data = tag.load_data()
+        x_tag = self.extract_x(tag_data)
+        y_tag = tag.load_y()
+        return x_tag, y_tag
 
     def extract_trainings_data(self, tags):
-        x, y = [], []
         print("[INFO] Extracting Features: [{}] for Tags".format(self.describe_sampling()))
-        for tag in tqdm(tags):
-            tag_data = tag.load_data()
-            x_tag = self.extract_x(tag_data)
-            y_tag = tag.load_y()
-
-            x.append(x_tag)
-            y.append(y_tag)
+        # OpenCV releases the GIL, threads avoid copying images between processes
+        results = Parallel(n_jobs=self.n_jobs, backend="threading")(
+            delayed(self._process_tag)(tag) for tag in tqdm(tags)
+        )
+        x = [x_tag for x_tag, _ in results]
+        y = [y_tag for _, y_tag in results]
         assert x is not None, "No Feature was activated"
         return x, y
 
     def extract_x(self, image):
-        kp_set = KeyPointSet(self.sampling_method, self.sampling_steps, self.sampling_window)
         image = self.resize(image, self.img_height, self.img_width)
         x = []
-        for feature in self.features_to_use:
-            dc_set = DescriptorSet(feature)
-            dc_x = dc_set.compute(image, kp_set)
+        for dc_set in self.dc_sets:
+            dc_x = dc_set.compute(image, self.kp_set)
             if dc_x is None:
                 continue
             x.append(dc_x)
         if len(x) == 0:
             return None
         if len(x) == 1:
-            return x[0]
-        return np.concatenate(x, axis=1)
+            return x[0].astype(np.float32, copy=False)
+        return np.concatenate(x, axis=1, dtype=np.float32)
@@ -12,35 +12,62 @@ class FeatureMap:
         return resolution * mat.normalize()
 
     def to_descriptors_with_histogram(self, key_points, resolution):
-        descriptors = []
-        mat = MatrixHandler(self.set_to_resolution(resolution))
-        for x, y, s in key_points:
-            roi = mat.cut_roi([x, y], s)
-            desc, bins = np.histogram(roi.ravel(),
-                                      range=[0, resolution],
-                                      bins=resolution,
-                                      density=True)
-            desc = np.reshape(desc, (1, -1))
-            descriptors.append(desc)
-        if len(descriptors) == 0:
+        if len(key_points) == 0:
             return None
-        elif len(descriptors) == 1:
-            return descriptors[0]
-        else:
-            return np.concatenate(descriptors, axis=0)
+        f_map = self.set_to_resolution(resolution)
+        height, width = f_map.shape[:2]
+        x1, y1, x2, y2 = roi_bounds(key_points, height, width)
+
+        # Bin the whole map once, each ROI then only needs a bincount over its slice
+        bin_ids = np.clip(np.floor(f_map), 0, resolution - 1).astype(int)
+        descriptors = np.stack([
+            np.bincount(bin_ids[y1[i]:y2[i], x1[i]:x2[i]].ravel(), minlength=resolution) for i in range(len(x1))
+        ]).astype(np.float64)
+
+        with np.errstate(invalid="ignore"):
+            descriptors /= np.sum(descriptors, axis=1, keepdims=True)
+        return descriptors
 
     def to_descriptor_with_pooling(self, key_points, pooling_mode, roll_to_max_first=True):
         if len(key_points) == 0:
             return np.array([])
-        descriptors = []
-        mat_h_f_map = MatrixHandler(self.feature_map)
-        for x, y, s in key_points:
-            roi = mat_h_f_map.cut_roi([x, y], s)
-            mat_h_roi = MatrixHandler(roi)
-            desc = mat_h_roi.global_pooling(pooling_mode=pooling_mode)
-            if roll_to_max_first:
-                _, num_features = desc.shape
-                max_idx = np.argmax(desc, axis=1)[0]
-                desc = np.roll(desc, num_features-max_idx, axis=1)
-            descriptors.append(desc)
-        return np.concatenate(descriptors, axis=0)
+        f_map = self.feature_map
+        if f_map.ndim == 2:
+            f_map = f_map[:, :, np.newaxis]
+        height, width = f_map.shape[:2]
+        x1, y1, x2, y2 = roi_bounds(key_points, height, width)
+
+        if pooling_mode in ["mean", "sum", "max", "min"]:
+            reduce = {"mean": np.mean, "sum": np.sum, "max": np.max, "min": np.min}[pooling_mode]
+            descriptors = np.stack([
+                reduce(f_map[y1[i]:y2[i], x1[i]:x2[i]], axis=(0, 1)) for i in range(len(x1))
+            ])
+        else:
+            raise ValueError("Error: Down-Sampling only supports none, min, max and mean")
+
+        if roll_to_max_first:
+            num_features = descriptors.shape[1]
+            max_idx = np.argmax(descriptors, axis=1)[:, np.newaxis]
+            shifted_idx = (np.arange(num_features)[np.newaxis, :] + max_idx) % num_features
+            descriptors = np.take_along_axis(descriptors, shifted_idx, axis=1)
+        return descriptors
+
+
+def roi_bounds(key_points, height, width):
+    """
+    Computes the ROI of every key point the same way as MatrixHandler.cut_roi
+    Args:
+        key_points: list of [x, y, size]
+        height: height of the feature map
+        width: width of the feature map
+
+    Returns:
+        x1, y1, x2, y2 arrays of slice bounds clipped to the feature map
+    """
+    key_points = np.array(key_points, dtype=np.float64)
+    x, y, s = key_points[:, 0], key_points[:, 1], key_points[:, 2]
+    x1 = np.clip(np.trunc(x - s / 2).astype(int), 0, width)
+    y1 = np.clip(np.trunc(y - s / 2).astype(int), 0, height)
+    x2 = np.clip(np.trunc(x + s / 2).astype(int), x1, width)
+    y2 = np.clip(np.trunc(y + s / 2).astype(int), y1, height)
+    return x1, y1, x2, y2
@@ -153,7 +153,7 @@ class ImageClassifier:
                 tag.write_prediction(y_pred, report_path)
             y.append(tag.load_y())
             predictions.append(y_pred[0])
-            confidences.append(conf)
+            confidences.append(conf[0])
             result_dict = tag.evaluate_prediction(y_pred, result_dict)
 
         show_results(result_dict)
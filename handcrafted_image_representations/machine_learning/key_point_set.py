@@ -39,6 +39,7 @@ class KeyPointSet:
         self.key_point_mode = key_point_mode
         self.sampling_steps = sampling_steps
         self.sampling_window = sampling_window
+        self.kp_detector = None
 
     def _define_dense_key_point_grid(self, image):
         height, width = image.shape[:2]
@@ -52,9 +53,9 @@ class KeyPointSet:
         return key_points
 
     def _detect_open_cv_key_points(self, image):
-        open_cv_extractors = build_open_cv_key_point_detectors()
-        kp_detector = open_cv_extractors[self.key_point_mode]
-        open_cv_key_points = kp_detector.detect(image)
+        if self.kp_detector is None:
+            self.kp_detector = build_open_cv_key_point_detectors()[self.key_point_mode]
+        open_cv_key_points = self.kp_detector.detect(image)
         return open_cv_key_points
 
     def get_key_points(self, image):
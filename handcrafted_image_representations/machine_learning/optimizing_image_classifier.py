@@ -1,10 +1,38 @@
 import copy
 import numpy as np
 from sklearn.model_selection import ParameterGrid
+from sklearn.utils.class_weight import compute_sample_weight
 from handcrafted_image_representations.data_structure.data_set import DataSet
 from handcrafted_image_representations import machine_learning as ml
 
 from handcrafted_image_representations.utils.data_split import split_tags
+from handcrafted_image_representations.utils.search_utils import successive_halving
+
+
+def halve_classifiers(classifier_list, x_train, y_train, x_test, y_test, factor=3):
+    """
+    Selects classifiers by successive halving on subsets of the training data
+    Returns:
+        surviving candidates, which still have to be fitted on the full training data
+    """
+    y_train = np.array(y_train)
+    n_classes = np.unique(y_train).size
+
+    def score_on_subset(cls, idx):
+        # the estimator has to match the one that is refitted on the full training data
+        cls.fit(x_train[idx], y_train[idx], n_samples=len(x_train))
+        return cls.evaluate(x_test, y_test, print_results=False)
+
+    def has_all_classes(idx):
+        return np.unique(y_train[idx]).size == n_classes
+
+    return successive_halving(classifier_list, score_on_subset, len(x_train), factor, has_all_classes)
+
+
+def aggregate_train_test(aggregator, x_train, x_test):
+    x_transformed_train = np.concatenate(aggregator.fit_transform(x_train), axis=0)
+    x_transformed_test = np.concatenate(aggregator.transform(x_test), axis=0)
+    return x_transformed_train, x_transformed_test
 
 
 class OptimizingImageClassifier:
@@ -60,43 +88,46 @@ class OptimizingImageClassifier:
 
         x_train, y_train = self.feature_extractor.extract_trainings_data(train_tags)
         x_test, y_test = self.feature_extractor.extract_trainings_data(test_tags)
+        sample_weight = compute_sample_weight("balanced", y_train)
 
         for aggregator in self.aggregator_list:
-            x_transformed_train = aggregator.fit_transform(x_train)
-            x_transformed_test = aggregator.transform(x_test)
+            # Aggregated features only depend on the aggregator and are shared by all classifiers
+            x_transformed_train, x_transformed_test = aggregate_train_test(aggregator, x_train, x_test)
 
-            x_transformed_train = np.concatenate(x_transformed_train, axis=0)
-            x_transformed_test = np.concatenate(x_transformed_test, axis=0)
+            classifier_list = self.classifier_list
+            if self.opt.get("search") == "halving":
+                classifier_list = halve_classifiers(
+                    classifier_list, x_transformed_train, y_train, x_transformed_test, y_test
+                )
 
-            for cls in self.classifier_list:
-                cls.fit(x_transformed_train, y_train)
+            for cls in classifier_list:
+                cls.fit(x_transformed_train, y_train, sample_weight=sample_weight)
                 f_1_score = cls.evaluate(x_transformed_test, y_test, print_results=False)
                 if f_1_score >= best_f1_score:
                     best_f1_score = f_1_score
-                    best_candidate = [aggregator, cls]
-
-                    current_opt = copy.deepcopy(self.opt)
-                    for k in aggregator.opt:
-                        current_opt[k] = best_candidate[0].opt[k]
-                    for k in cls.opt:
-                        current_opt[k] = best_candidate[1].opt[k]
-
-                    self.final_classifier = ml.ImageClassifier(
-                        class_mapping=self.class_mapping,
-                        image_size_height=current_opt["image_size"]["height"],
-                        image_size_width=current_opt["image_size"]["width"],
-                        aggregator=current_opt["aggregator"], 
-                        complexity=current_opt["complexity"],
-                        feature=current_opt["feature"],
-                        sampling_method=current_opt["sampling_method"],
-                        sampling_step=current_opt["sampling_step"],
-                        sampling_window=current_opt["sampling_window"],
-                        clf_type=current_opt["clf_type"]
-                    )
-                    self.final_classifier.feature_extractor = self.feature_extractor
-                    self.final_classifier.aggregator = aggregator
-                    self.final_classifier.classifier = cls
-                    self.final_classifier.save(model_folder)
+                    # cls is refitted for the next aggregator, keep the current estimator
+                    best_candidate = [aggregator, copy.copy(cls)]
+
+        current_opt = dict(self.opt)
+        current_opt.update(best_candidate[0].opt)
+        current_opt.update(best_candidate[1].opt)
+
+        self.final_classifier = ml.ImageClassifier(
+            class_mapping=self.class_mapping,
+            image_size_height=current_opt["image_size"]["height"],
+            image_size_width=current_opt["image_size"]["width"],
+            aggregator=current_opt["aggregator"],
+            complexity=current_opt["complexity"],
+            feature=current_opt["feature"],
+            sampling_method=current_opt["sampling_method"],
+            sampling_step=current_opt["sampling_step"],
+            sampling_window=current_opt["sampling_window"],
+            clf_type=current_opt["clf_type"]
+        )
+        self.final_classifier.feature_extractor = self.feature_extractor
+        self.final_classifier.aggregator = best_candidate[0]
+        self.final_classifier.classifier = best_candidate[1]
+        self.final_classifier.save(model_folder)
 
         print("[RESULT] Best F1-Score: {}".format(best_f1_score))
         for k in best_candidate[0].opt:
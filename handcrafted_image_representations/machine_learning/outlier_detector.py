@@ -1,5 +1,8 @@
 import copy
+import hashlib
 import joblib
+from joblib import Parallel, cpu_count, delayed, effective_n_jobs, parallel_backend
+from threadpoolctl import threadpool_limits
 import numpy as np
 from sklearn.model_selection import ParameterGrid
 from handcrafted_image_representations.data_structure.data_set import DataSet
@@ -7,15 +10,44 @@ from handcrafted_image_representations import machine_learning as ml
 
 import os
 import shutil
-from handcrafted_image_representations.utils.utils import check_n_make_dir, save_dict, load_dict
+import threading
+from collections import OrderedDict
+from handcrafted_image_representations.utils.utils import check_n_make_dir, save_dict, load_dict, save_model
 from handcrafted_image_representations.utils.outlier_removal import get_best_threshold
+from handcrafted_image_representations.utils.search_utils import successive_halving
 
 from sklearn.ensemble import IsolationForest, RandomForestClassifier
-from sklearn.gaussian_process import GaussianProcessClassifier, kernels
+from sklearn.kernel_approximation import Nystroem
+from sklearn.linear_model import LogisticRegression
+from sklearn.pipeline import make_pipeline
 
 from sklearn.metrics import roc_auc_score, classification_report
 
 
+def score_in_chunks(remover, x, chunk_size=4096):
+    """
+    Scores samples block by block to bound the peak memory of the remover
+    Args:
+        remover: fitted outlier remover providing score_sample
+        x: samples to score
+        chunk_size: maximum number of rows scored at once
+
+    Returns:
+        score per sample
+    """
+    if len(x) <= chunk_size:
+        return remover.score_sample(x)
+    return np.concatenate([remover.score_sample(x[i:i + chunk_size]) for i in range(0, len(x), chunk_size)])
+
+
+def load_known_and_test_tags(data_path_known, data_path_test, tag_type, class_mapping):
+    ds = DataSet(data_path_known, tag_type, class_mapping)
+    ds_test = DataSet(data_path_test, tag_type, class_mapping)
+    tags = ds.get_tags(class_mapping)
+    tags_test = ds_test.get_tags(classes_to_consider="all")
+    return tags, tags_test
+
+
 class OutlierByGaussianProcess:
     def __init__(self):
         self.model = None
@@ -24,7 +56,12 @@ class OutlierByGaussianProcess:
         return "OutlierByGaussianProcess"
 
     def fit(self, x, y):
-        self.model = GaussianProcessClassifier((1.0 * kernels.RBF(1.0)), n_jobs=-1)
+        # Nystroem approximates the RBF kernel (length scale 1.0) with a low rank feature map,
+        # avoiding the full kernel matrix of an exact GaussianProcessClassifier
+        self.model = make_pipeline(
+            Nystroem(kernel="rbf", gamma=0.5, n_components=min(256, len(x)), n_jobs=-1),
+            LogisticRegression(max_iter=1000),
+        )
         self.model.fit(x, y)
 
     def score_sample(self, x):
@@ -38,7 +75,7 @@ class OutlierByGaussianProcess:
     def save(self, path):
         path_to_model = os.path.join(path, "outlier_model.pkl")
         if self.model is not None:
-            joblib.dump(self.model, path_to_model)
+            save_model(self.model, path_to_model)
 
 
 class OutlierByRandomForest:
@@ -60,7 +97,7 @@ class OutlierByRandomForest:
     def save(self, path):
         path_to_model = os.path.join(path, "outlier_model.pkl")
         if self.model is not None:
-            joblib.dump(self.model, path_to_model)
+            save_model(self.model, path_to_model)
 
 
 class OutlierByIsolationForest:
@@ -72,7 +109,11 @@ class OutlierByIsolationForest:
         self.model.fit(x)
 
     def score_sample(self, x):
-        return self.model.score_samples(x)
+        if len(x) < 1000:
+            return self.model.score_samples(x)
+        # IsolationForest scores its trees sequentially unless a backend is configured around the call
+        with parallel_backend("threading", n_jobs=-1):
+            return self.model.score_samples(x)
 
     def load(self, path):
         path_to_model = os.path.join(path, "outlier_model.pkl")
@@ -81,27 +122,36 @@ class OutlierByIsolationForest:
     def save(self, path):
         path_to_model = os.path.join(path, "outlier_model.pkl")
         if self.model is not None:
-            joblib.dump(self.model, path_to_model)
+            save_model(self.model, path_to_model)
 
 
 class OutlierByDistance:
     def __init__(self):
         self.x_mean = None
         self.x_std = None
+        self.inv_std = None
         self.max_distance = None
         self.min_distance = None
 
     def __str__(self):
         return "OutlierByDistance"
 
-    def compute_distance(self, x):
-        distance = np.square((x - self.x_mean) / self.x_std)
-        return np.sqrt(np.sum(distance, axis=1))
+    def compute_distance(self, x, block_bytes=2 ** 19):
+        # Standardize a block of rows at a time, so the temporary stays in cache instead of spanning all of x
+        block_size = max(1, block_bytes // (8 * x.shape[1]))
+        squared = np.empty(len(x))
+        for i in range(0, len(x), block_size):
+            z = x[i:i + block_size] - self.x_mean
+            z *= self.inv_std
+            # einsum reduces the squares row by row without materializing them
+            squared[i:i + block_size] = np.einsum("ij,ij->i", z, z)
+        return np.sqrt(squared)
 
     def fit(self, x, y=None):
         self.x_mean = np.mean(x, axis=0)
         self.x_std = np.std(x, axis=0)
         self.x_std[self.x_std == 0.0] = 1e-9
+        self.inv_std = 1.0 / self.x_std
 
         dist = self.compute_distance(x)
         self.max_distance = np.max(dist)
@@ -119,20 +169,27 @@ class OutlierByDistance:
 
     def save(self, path):
         param_path = os.path.join(path, "outlier_parameters.json")
-        np.save(os.path.join(path, "outlier_param_x_mean.npy"), self.x_mean)
-        np.save(os.path.join(path, "outlier_param_x_std.npy"), self.x_std)
+        np.save(os.path.join(path, "outlier_param_x_mean.npy"), self.x_mean.astype(np.float32, copy=False))
+        np.save(os.path.join(path, "outlier_param_x_std.npy"), self.x_std.astype(np.float32, copy=False))
+        np.save(os.path.join(path, "outlier_param_inv_std.npy"), self.inv_std.astype(np.float32, copy=False))
         save_dict({
-            "max_dist": int(self.max_distance),
-            "min_dist": int(self.min_distance),
+            "max_dist": float(self.max_distance),
+            "min_dist": float(self.min_distance),
         }, param_path)
 
     def load(self, path):
         param_path = os.path.join(path, "outlier_parameters.json")
         param = load_dict(param_path)
-        self.x_mean = np.load(os.path.join(path, "outlier_param_x_mean.npy"))
-        self.x_std = np.load(os.path.join(path, "outlier_param_x_std.npy"))
-        self.max_distance = int(param["max_dist"])
-        self.min_distance = int(param["min_dist"])
+        # Memory mapped read-only, the parameters are only ever read after fitting
+        self.x_mean = np.load(os.path.join(path, "outlier_param_x_mean.npy"), mmap_mode="r")
+        self.x_std = np.load(os.path.join(path, "outlier_param_x_std.npy"), mmap_mode="r")
+        path_to_inv_std = os.path.join(path, "outlier_param_inv_std.npy")
+        if os.path.isfile(path_to_inv_std):
+            self.inv_std = np.load(path_to_inv_std, mmap_mode="r")
+        else:
+            self.inv_std = 1.0 / self.x_std
+        self.max_distance = float(param["max_dist"])
+        self.min_distance = float(param["min_dist"])
 
 
 class OutlierDetector:
@@ -173,25 +230,22 @@ class OutlierDetector:
     def evaluate(self, data_path_test, tag_type, results_path):
         print("[INFO] EVALUATING...")
         ds_test = DataSet(data_path_test, tag_type, self.class_mapping)
-        ds_test.load_data()
         tags_test = ds_test.get_tags(classes_to_consider="all")
 
         x_test, y_test = self.feature_extractor.extract_trainings_data(tags_test)
-        y_test = np.array(y_test)
-        y_test[y_test != -1] = 1
+        y_test = np.where(np.array(y_test) == -1, -1, 1)
 
-        x_transformed_test = self.aggregator.transform(x_test)
-        x_transformed_test = np.concatenate(x_transformed_test, axis=0)
-        y_rm = self.remover.score_sample(x_transformed_test)
+        x_transformed_test = np.concatenate(self.aggregator.transform(x_test), axis=0)
+        del x_test
+        y_rm = score_in_chunks(self.remover, x_transformed_test)
+        del x_transformed_test
         score = roc_auc_score(y_test, y_rm)
         best_threshold = get_best_threshold(y_rm, y_test)
 
         s = ""
         s += "[RESULT]: AUROC {} / THRESHOLD: {}\n\n".format(score, best_threshold)
 
-        remove_status = np.zeros(y_rm.shape)
-        remove_status[y_rm >= best_threshold] = 1
-        remove_status[y_rm < best_threshold] = -1
+        remove_status = np.where(y_rm >= best_threshold, 1, -1)
         s += str(classification_report(y_test, remove_status))
 
         print(s)
@@ -202,30 +256,32 @@ class OutlierDetector:
         check_n_make_dir(path_wrongly_accepted)
         path_wrongly_rejected = os.path.join(results_path, "wrongly_rejected")
         check_n_make_dir(path_wrongly_rejected)
-        for tag_id in tags_test:
-            tag = tags_test[tag_id]
-            if remove_status[tag_id] == -1 and y_test[tag_id] == 1:
-                tag.export_box(path_wrongly_rejected)
-
-            if remove_status[tag_id] == 1 and y_test[tag_id] == -1:
-                tag.export_box(path_wrongly_accepted)
+        # Rows follow the order of tags_test, only the misclassified tags are visited
+        for i in np.flatnonzero((remove_status == -1) & (y_test == 1)):
+            tags_test[i].export_box(path_wrongly_rejected)
+        for i in np.flatnonzero((remove_status == 1) & (y_test == -1)):
+            tags_test[i].export_box(path_wrongly_accepted)
 
 
 class OutlierDetectorAggregatorSearch:
-    def __init__(self, opt, class_mapping):
+    def __init__(self, opt, class_mapping, n_jobs=-1):
         self.opt = opt
         self.class_mapping = class_mapping
+        self.n_jobs = n_jobs
 
         self.aggregator_opt = ["aggregator", "complexity"]
 
         self.feature_extractor = None
         self.aggregator_list = None
-        self.remover_list = None
-        self.remover = None
 
         self.final_aggregator = None
         self.final_remover = None
 
+        # Fitted removers keyed by a hash of their training data, so identical aggregator outputs are fitted once
+        self.remover_cache_size = opt.get("remover_cache_size", 8)
+        self._remover_cache = OrderedDict()
+        self._remover_cache_lock = threading.Lock()
+
     def new(self):
         self.feature_extractor = ml.FeatureExtractor(
             features_to_use=self.opt["feature"],
@@ -244,54 +300,100 @@ class OutlierDetectorAggregatorSearch:
 
         aggregator_opt_list = list(ParameterGrid({k: self.opt[k] for k in self.aggregator_opt if k in self.opt}))
 
-        self.aggregator_list = [ml.Aggregator(opt) for opt in aggregator_opt_list]
+        # Global aggregators ignore the complexity, add each of them only once
+        self.aggregator_list = [ml.Aggregator(opt) for opt in aggregator_opt_list if "global_" not in opt["aggregator"]]
+        for agg in self.opt["aggregator"]:
+            if "global_" in agg:
+                self.aggregator_list.append(ml.Aggregator({"aggregator": agg}))
+
+    def new_remover(self):
         if self.opt["method"] == "by_classifier":
-            self.remover = OutlierByGaussianProcess()
-        else:
-            self.remover = OutlierByDistance()
+            return OutlierByGaussianProcess()
+        return OutlierByDistance()
 
     def fit(self, model_folder, data_path_known, data_path_test, tag_type, report_path=None):
+        tags, tags_test = load_known_and_test_tags(data_path_known, data_path_test, tag_type, self.class_mapping)
+        return self.fit_tags(model_folder, tags, tags_test, report_path)
+
+    def fit_tags(self, model_folder, tags, tags_test, report_path=None):
         self.new()
         best_score = 0
         best_candidate = None
 
-        ds = DataSet(data_path_known, tag_type, self.class_mapping)
-        ds.load_data()
-        ds_test = DataSet(data_path_test, tag_type, self.class_mapping)
-        ds_test.load_data()
-        tags = ds.get_tags(self.class_mapping)
-        tags_test = ds_test.get_tags(classes_to_consider="all")
-
         x, y = self.feature_extractor.extract_trainings_data(tags)
         x_test, y_test = self.feature_extractor.extract_trainings_data(tags_test)
         y_test = np.array(y_test)
         y_test[y_test != -1] = 1
 
-        for aggregator in self.aggregator_list:
-            x_transformed = aggregator.fit_transform(x)
-            x_transformed_test = aggregator.transform(x_test)
-            x_transformed = np.concatenate(x_transformed, axis=0)
-            x_transformed_test = np.concatenate(x_transformed_test, axis=0)
-            self.remover.fit(x_transformed, y)
-            y_rm = self.remover.score_sample(x_transformed_test)
-            score = roc_auc_score(y_test, y_rm)
-            print("RUN: {} / {} - AUROC: {}".format(aggregator, self.remover, round(score, 3)))
+        aggregator_list = self.aggregator_list
+        if self.opt.get("search") == "halving":
+            y = np.array(y)
+            n_classes = np.unique(y).size
+            aggregator_list = successive_halving(
+                aggregator_list,
+                lambda aggregator, idx: self.score_aggregator(aggregator, [x[i] for i in idx], y[idx], x_test, y_test)[0],
+                len(x),
+                is_valid_subset=lambda idx: np.unique(y[idx]).size == n_classes,
+            )
+
+        # Every aggregator is fitted and scored independently. Threads share x and x_test without copies,
+        # and k-means as well as the removers spend most of their time in native code.
+        # The cores are split between the candidates, so their OpenMP/BLAS pools do not oversubscribe the machine.
+        n_workers = max(1, min(effective_n_jobs(self.n_jobs), len(aggregator_list)))
+        with threadpool_limits(limits=max(1, cpu_count() // n_workers)):
+            results = Parallel(n_jobs=n_workers, backend="threading")(
+                delayed(self.score_aggregator)(aggregator, x, y, x_test, y_test) for aggregator in aggregator_list
+            )
+
+        for aggregator, (score, remover) in zip(aggregator_list, results):
+            print("RUN: {} / {} - AUROC: {}".format(aggregator, remover, round(score, 3)))
             if score > best_score:
                 best_score = score
                 best_candidate = aggregator
                 self.final_aggregator = aggregator
-                self.final_remover = self.remover
-                current_opt = copy.deepcopy(self.opt)
-                for k in aggregator.opt:
-                    current_opt[k] = best_candidate.opt[k]
-                self.save(model_folder, current_opt)
+                self.final_remover = remover
+
+        current_opt = copy.deepcopy(self.opt)
+        for k in best_candidate.opt:
+            current_opt[k] = best_candidate.opt[k]
+        self.save(model_folder, current_opt)
 
         print("[RESULT] Best AUROC-Score: {}".format(best_score))
         for k in best_candidate.opt:
+            if k not in self.opt:
+                continue
             print("[RESULT] ", k, self.opt[k], " --> ", best_candidate.opt[k])
             self.opt[k] = best_candidate.opt[k]
         return best_score
 
+    def score_aggregator(self, aggregator, x, y, x_test, y_test):
+        x_transformed = np.concatenate(aggregator.fit_transform(x), axis=0)
+        x_transformed_test = np.concatenate(aggregator.transform(x_test), axis=0)
+        remover = self.fit_remover(x_transformed, y)
+        y_rm = score_in_chunks(remover, x_transformed_test)
+        return roc_auc_score(y_test, y_rm), remover
+
+    def fit_remover(self, x, y):
+        if self.opt["method"] != "by_classifier":
+            # Fitting by distance is a few reductions, hashing would cost about as much
+            remover = self.new_remover()
+            remover.fit(x, y)
+            return remover
+        h = hashlib.blake2b(memoryview(np.ascontiguousarray(x)), digest_size=16)
+        h.update(memoryview(np.ascontiguousarray(y)))
+        key = h.hexdigest()
+        with self._remover_cache_lock:
+            if key in self._remover_cache:
+                self._remover_cache.move_to_end(key)
+                return self._remover_cache[key]
+        remover = self.new_remover()
+        remover.fit(x, y)
+        with self._remover_cache_lock:
+            self._remover_cache[key] = remover
+            if len(self._remover_cache) > self.remover_cache_size:
+                self._remover_cache.popitem(last=False)
+        return remover
+
     def save(self, path, current_opt):
         check_n_make_dir(path)
         path_to_opt = os.path.join(path, "outlier_detector_opt.json")
@@ -335,13 +437,14 @@ class OutlierDetectorSearch:
         best_candidate = None
 
         check_n_make_dir(model_folder)
+        # All feature settings are evaluated on the same tags, load them only once
+        tags, tags_test = load_known_and_test_tags(data_path_known, data_path_test, tag_type, self.class_mapping)
 
         for i, model in enumerate(self.model_list):
-            score = model.fit(
+            score = model.fit_tags(
                 os.path.join(model_folder, "version_{}".format(i)),
-                data_path_known,
-                data_path_test,
-                tag_type,
+                tags,
+                tags_test,
                 report_path=report_path
             )
 
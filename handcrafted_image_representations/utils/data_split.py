@@ -1,29 +1,27 @@
-import numpy as np
-
+from itertools import compress
 
-def split_random(list_of_tags, ratio=0.2):
-    train_tags = []
-    test_tags = []
+import numpy as np
 
-    for tag in list_of_tags:
-        if np.random.randint(100) / 100 > ratio:
-            train_tags.append(tag)
-        else:
-            test_tags.append(tag)
 
+def split_random(list_of_tags, ratio=0.2, seed=None):
+    # A generator per call is cheap and, unlike a shared one, safe to use from several threads
+    rng = np.random.default_rng(seed)
+    is_train = rng.random(len(list_of_tags)) > ratio
+    train_tags = list(compress(list_of_tags, is_train))
+    test_tags = list(compress(list_of_tags, ~is_train))
     return train_tags, test_tags
 
 
 def split_fixed(list_of_tags, ratio=0.2):
-    n_tags = len(list_of_tags)
-    train_tags = list_of_tags[int(ratio * n_tags):]
-    test_tags = list_of_tags[:int(ratio * n_tags)]
+    n_test = int(ratio * len(list_of_tags))
+    train_tags = list_of_tags[n_test:]
+    test_tags = list_of_tags[:n_test]
     return train_tags, test_tags
 
 
-def split_tags(list_of_tags, ratio=0.2, mode="random"):
+def split_tags(list_of_tags, ratio=0.2, mode="random", seed=None):
     if mode == "random":
-        return split_random(list_of_tags, ratio)
+        return split_random(list_of_tags, ratio, seed)
     elif mode == "fixed":
         return split_fixed(list_of_tags, ratio)
     else:
@@ -0,0 +1,33 @@
+import numpy as np
+
+
+def successive_halving(candidates, score_on_subset, n_samples, factor=3, is_valid_subset=None):
+    """
+    Successive halving: candidates are scored on growing random subsets of the training data
+    and only the best 1/factor of them is promoted to the next round
+    Args:
+        candidates: list of candidates to choose from
+        score_on_subset: function(candidate, idx) training the candidate on the samples idx and returning its score
+        n_samples: number of training samples
+        factor: reduction of candidates and growth of the training subset per round
+        is_valid_subset: optional function(idx), rounds on subsets it rejects are skipped
+
+    Returns:
+        surviving candidates, which still have to be trained on all samples
+    """
+    rng = np.random.default_rng()
+    candidates = list(candidates)
+    n_rounds = 0
+    n_candidates = len(candidates)
+    while n_candidates > 1:
+        n_candidates = int(np.ceil(n_candidates / factor))
+        n_rounds += 1
+
+    for i in range(n_rounds, 0, -1):
+        idx = rng.choice(n_samples, n_samples // factor ** i, replace=False)
+        if is_valid_subset is not None and not is_valid_subset(idx):
+            continue
+        scores = [score_on_subset(candidate, idx) for candidate in candidates]
+        n_keep = int(np.ceil(len(candidates) / factor))
+        candidates = [candidates[j] for j in np.argsort(scores)[::-1][:n_keep]]
+    return candidates
@@ -1,5 +1,13 @@
 import os
 import json
+import joblib
+
+# lz4 is optional, zlib would slow down dumping large forests far more than it saves on disk
+try:
+    import lz4  # noqa: F401
+    MODEL_COMPRESSION = ("lz4", 3)
+except ImportError:
+    MODEL_COMPRESSION = 0
 
 
 def check_n_make_dir(tar_dir, clean=False):
@@ -30,3 +38,7 @@ def load_dict(path_to_load):
     with open(path_to_load) as json_file:
         dict_to_load = json.load(json_file)
     return dict_to_load
+
+
+def save_model(model, path_to_save):
+    joblib.dump(model, path_to_save, compress=MODEL_COMPRESSION)
@@ -13,6 +13,7 @@ REQUIRED_PACKAGES = [
       "scikit-image",
       "numpy",
       "joblib",
+      "threadpoolctl",
       "seaborn"
 ]
 
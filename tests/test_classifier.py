@@ -1,6 +1,8 @@
 import unittest
 import numpy as np
-from handcrafted_image_representations.machine_learning.classifier import Classifier
+from sklearn.linear_model import SGDClassifier
+from sklearn.svm import SVC
+from handcrafted_image_representations.machine_learning.classifier import Classifier, init_classifier
 
 
 class TestClassifier(unittest.TestCase):
@@ -17,6 +19,12 @@ class TestClassifier(unittest.TestCase):
         classifier.fit(self.x_train, self.y_train)
         self.assertIsNotNone(classifier.classifier)
 
+    def test_fit_with_sample_weight(self):
+        for clf in ["lr", "rf_100", "knn_3"]:
+            classifier = Classifier({"clf_type": clf})
+            classifier.fit(self.x_train, self.y_train, sample_weight=np.ones(len(self.y_train)))
+            self.assertIsNotNone(classifier.classifier)
+
     def test_predict(self):
         classifier = Classifier()
         classifier.opt = {"clf_type": "lr"}
@@ -24,6 +32,23 @@ class TestClassifier(unittest.TestCase):
         predictions = classifier.predict(self.x_test)
         self.assertEqual(predictions.shape, self.y_test.shape)
 
+    def test_predict_with_confidence(self):
+        for clf in ["lr", "svm"]:
+            classifier = Classifier()
+            classifier.opt = {"clf_type": clf}
+            classifier.fit(self.x_train, self.y_train)
+            predictions, confidences = classifier.predict(self.x_test, get_confidence=True)
+            self.assertEqual(predictions.shape, self.y_test.shape)
+            self.assertEqual(confidences.shape, self.y_test.shape)
+            np.testing.assert_array_equal(predictions, classifier.predict(self.x_test))
+
+    def test_predict_in_batches(self):
+        classifier = Classifier()
+        classifier.opt = {"clf_type": "lr"}
+        classifier.fit(self.x_train, self.y_train)
+        predictions = classifier.predict_in_batches(self.x_train, batch_size=64)
+        np.testing.assert_array_equal(predictions, classifier.predict(self.x_train))
+
     def test_evaluate(self):
         classifier = Classifier()
         classifier.opt = {"clf_type": "lr"}
@@ -38,6 +63,11 @@ class TestClassifier(unittest.TestCase):
             classifier.new()
             self.assertIsNotNone(classifier.classifier)
 
+    def test_init_classifier_large_data_set(self):
+        self.assertIsInstance(init_classifier({"clf_type": "svm"}, n_samples=100), SVC)
+        self.assertIsInstance(init_classifier({"clf_type": "svm"}, n_samples=100000), SGDClassifier)
+        self.assertEqual(init_classifier({"clf_type": "lr"}, n_samples=100000).solver, "lbfgs")
+
 
 if __name__ == "__main__":
     unittest.main()
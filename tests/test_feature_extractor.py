@@ -35,11 +35,25 @@ class TestFeatureExtractor(unittest.TestCase):
             resize_option=self.resize_option
         )
 
+    def test_features_to_use_as_list(self):
+        extractor = FeatureExtractor(features_to_use=["gray-sift", "rgb-lbp"])
+        self.assertEqual(extractor.features_to_use, ["gray-sift", "rgb-lbp"])
+        extractor = FeatureExtractor(features_to_use="gray-sift")
+        self.assertEqual(extractor.features_to_use, ["gray-sift"])
+
+    def test_resize(self):
+        image = np.zeros((128, 64, 3), dtype=np.uint8)
+        self.assertEqual(self.feature_extractor.resize(image, 64, 32).shape, (64, 32, 3))
+        self.assertEqual(self.feature_extractor.resize(image, 256, None).shape, (256, 128, 3))
+        self.assertEqual(self.feature_extractor.resize(image, 0.5, 0.5).shape, (64, 32, 3))
+        self.assertIs(self.feature_extractor.resize(image, 128, 64), image)
+
     def test_extract_x(self):
         mock_image = np.random.random((128, 128, 3))  # Mock an image
         with patch('cv2.resize', return_value=mock_image):
             x = self.feature_extractor.extract_x(mock_image)
             self.assertEqual(x.shape, (25, 128))
+            self.assertEqual(x.dtype, np.float32)
 
     def test_extract_trainings_data(self):
         mock_tag_data = np.random.random((128, 128, 3))  # Mock tag data
@@ -51,6 +65,15 @@ class TestFeatureExtractor(unittest.TestCase):
                     self.assertEqual(len(x), 1)
                     self.assertEqual(len(y), 1)
 
+    def test_transform(self):
+        mock_tag_data = np.random.random((128, 128, 3))
+        mock_tags = [BoxTag("./tests/test_data/images/img_0.jpg", "0", ["0", 0, 0, 128, 128], {"0": 0, "1": 1})]
+        with patch('cv2.resize', return_value=mock_tag_data):
+            with patch('handcrafted_image_representations.machine_learning.feature_extractor.tqdm', notqdm):
+                with patch('builtins.print'):
+                    x = self.feature_extractor.fit_transform(mock_tags)
+                    self.assertEqual(len(x), 1)
+
     def test_feature_settings(self):
         mock_image = np.random.random((128, 128, 3))
         mock_image = mock_image.astype(np.uint8)
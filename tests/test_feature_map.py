@@ -0,0 +1,51 @@
+import unittest
+import numpy as np
+from handcrafted_image_representations.data_structure.matrix_handler import MatrixHandler
+from handcrafted_image_representations.machine_learning.feature_map import FeatureMap
+
+
+class TestFeatureMap(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.feature_map = rng.random((32, 32, 6))
+        self.key_points = [[x, y, s] for x in range(4, 32, 8) for y in range(4, 32, 8) for s in [4, 7]]
+
+    def test_to_descriptors_with_histogram(self):
+        f_map = FeatureMap(self.feature_map[:, :, 0])
+        descriptors = f_map.to_descriptors_with_histogram(self.key_points, resolution=8)
+        self.assertEqual(descriptors.shape, (len(self.key_points), 8))
+        normed = f_map.set_to_resolution(8)
+        for desc, (x, y, s) in zip(descriptors, self.key_points):
+            roi = MatrixHandler(normed).cut_roi([x, y], s)
+            expected, _ = np.histogram(roi, bins=8, range=(0, 8))
+            np.testing.assert_allclose(desc, expected / np.sum(expected))
+
+    def test_to_descriptors_with_histogram_at_border(self):
+        f_map = FeatureMap(self.feature_map[:, :, 0])
+        descriptors = f_map.to_descriptors_with_histogram([[0, 0, 8], [31, 31, 8]], resolution=8)
+        np.testing.assert_allclose(np.sum(descriptors, axis=1), 1)
+        self.assertIsNone(f_map.to_descriptors_with_histogram([], resolution=8))
+
+    def test_to_descriptor_with_pooling(self):
+        f_map = FeatureMap(self.feature_map)
+        for pooling_mode in ["mean", "sum", "max", "min"]:
+            descriptors = f_map.to_descriptor_with_pooling(self.key_points, pooling_mode, roll_to_max_first=False)
+            self.assertEqual(descriptors.shape, (len(self.key_points), 6))
+            for desc, (x, y, s) in zip(descriptors, self.key_points):
+                roi = MatrixHandler(MatrixHandler(self.feature_map).cut_roi([x, y], s))
+                np.testing.assert_allclose(desc, roi.global_pooling(pooling_mode)[0])
+
+    def test_to_descriptor_with_pooling_roll_to_max_first(self):
+        f_map = FeatureMap(self.feature_map)
+        descriptors = f_map.to_descriptor_with_pooling(self.key_points, "mean")
+        np.testing.assert_array_equal(np.argmax(descriptors, axis=1), 0)
+
+    def test_to_descriptor_with_pooling_unknown_mode(self):
+        f_map = FeatureMap(self.feature_map)
+        with self.assertRaises(ValueError):
+            f_map.to_descriptor_with_pooling(self.key_points, "median")
+
+
+if __name__ == '__main__':
+    unittest.main()
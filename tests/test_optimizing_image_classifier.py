@@ -0,0 +1,34 @@
+import unittest
+import numpy as np
+from unittest.mock import patch
+from sklearn.linear_model import SGDClassifier
+from handcrafted_image_representations.machine_learning.classifier import Classifier
+from handcrafted_image_representations.machine_learning.optimizing_image_classifier import halve_classifiers
+
+
+class TestOptimizingImageClassifier(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.x_train = np.random.rand(270, 10)
+        cls.y_train = list(np.random.randint(0, 2, size=270))
+        cls.x_test = np.random.rand(30, 10)
+        cls.y_test = np.random.randint(0, 2, size=30)
+
+    def test_halve_classifiers(self):
+        classifier_list = [Classifier({"clf_type": clf}) for clf in ["lr", "knn_3", "knn_5", "rf_100"]]
+        survivors = halve_classifiers(classifier_list, self.x_train, self.y_train, self.x_test, self.y_test)
+        self.assertEqual(len(survivors), 1)
+        self.assertIn(survivors[0], classifier_list)
+
+    def test_halve_classifiers_uses_full_size_estimator(self):
+        classifier = Classifier({"clf_type": "svm"})
+        # the subsets stay below the limit, the full training set exceeds it
+        with patch('handcrafted_image_representations.machine_learning.classifier.LARGE_DATA_SET_SIZE', 200):
+            halve_classifiers(
+                [classifier, Classifier({"clf_type": "knn_3"})], self.x_train, self.y_train, self.x_test, self.y_test
+            )
+        self.assertIsInstance(classifier.classifier, SGDClassifier)
+
+
+if __name__ == "__main__":
+    unittest.main()
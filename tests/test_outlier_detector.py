@@ -0,0 +1,164 @@
+import os
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from unittest.mock import patch
+from handcrafted_image_representations.machine_learning.outlier_detector import (
+    OutlierDetector,
+    OutlierDetectorSearch,
+    OutlierDetectorAggregatorSearch,
+    OutlierByGaussianProcess,
+    OutlierByDistance,
+    OutlierByIsolationForest,
+    score_in_chunks,
+)
+
+
+def notqdm(iterable, *args, **kwargs):
+    """
+    replacement for tqdm that just passes back the iterable
+    useful to silence `tqdm` in tests
+    """
+    return iterable
+
+
+class TestOutlierDetector(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.x_train = np.random.rand(100, 8)
+        cls.y_train = np.random.randint(0, 2, size=100)
+        cls.x_test = np.random.rand(20, 8)
+
+    def setUp(self):
+        self.model_path = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.model_path)
+
+    def test_gaussian_process(self):
+        remover = OutlierByGaussianProcess()
+        remover.fit(self.x_train, self.y_train)
+        score = remover.score_sample(self.x_test)
+        self.assertEqual(score.shape, (20,))
+
+        remover.save(self.model_path)
+        self.assertTrue(os.path.isfile(os.path.join(self.model_path, "outlier_model.pkl")))
+        loaded = OutlierByGaussianProcess()
+        loaded.load(self.model_path)
+        np.testing.assert_allclose(loaded.score_sample(self.x_test), score)
+
+    def test_isolation_forest(self):
+        remover = OutlierByIsolationForest()
+        remover.fit(self.x_train, self.y_train)
+        x_large = np.random.rand(2000, 8)
+        np.testing.assert_allclose(
+            remover.score_sample(x_large)[:20],
+            remover.score_sample(x_large[:20]),
+        )
+
+    def test_distance(self):
+        remover = OutlierByDistance()
+        remover.fit(self.x_train)
+        score = remover.score_sample(self.x_test)
+        self.assertEqual(score.shape, (20,))
+        self.assertTrue(np.all(score <= 0))
+        distance = np.sqrt(np.sum(np.square((self.x_test - remover.x_mean) / remover.x_std), axis=1))
+        np.testing.assert_allclose(remover.compute_distance(self.x_test), distance)
+        np.testing.assert_allclose(remover.compute_distance(self.x_test, block_bytes=3 * 8 * 8), distance)
+
+    def test_distance_save_load(self):
+        remover = OutlierByDistance()
+        remover.fit(self.x_train)
+        remover.save(self.model_path)
+        loaded = OutlierByDistance()
+        loaded.load(self.model_path)
+        self.assertEqual(loaded.x_mean.dtype, np.float32)
+        np.testing.assert_allclose(loaded.inv_std, 1.0 / remover.x_std, rtol=1e-6)
+        self.assertAlmostEqual(loaded.max_distance, remover.max_distance)
+        self.assertAlmostEqual(loaded.min_distance, remover.min_distance)
+        np.testing.assert_allclose(loaded.score_sample(self.x_test), remover.score_sample(self.x_test), rtol=1e-5)
+
+    def test_distance_load_without_inv_std(self):
+        remover = OutlierByDistance()
+        remover.fit(self.x_train)
+        remover.save(self.model_path)
+        os.remove(os.path.join(self.model_path, "outlier_param_inv_std.npy"))
+        loaded = OutlierByDistance()
+        loaded.load(self.model_path)
+        np.testing.assert_allclose(loaded.inv_std, 1.0 / remover.x_std, rtol=1e-6)
+
+    def test_score_in_chunks(self):
+        remover = OutlierByDistance()
+        remover.fit(self.x_train)
+        np.testing.assert_allclose(
+            score_in_chunks(remover, self.x_train, chunk_size=16),
+            remover.score_sample(self.x_train),
+        )
+
+    def test_remover_cache(self):
+        search = OutlierDetectorAggregatorSearch({"method": "by_classifier", "remover_cache_size": 2}, {"0": 0})
+        first = search.fit_remover(self.x_train, self.y_train)
+        self.assertIs(search.fit_remover(self.x_train.copy(), self.y_train.copy()), first)
+        self.assertIsNot(search.fit_remover(self.x_train + 1, self.y_train), first)
+        search.fit_remover(self.x_train + 2, self.y_train)
+        self.assertEqual(len(search._remover_cache), 2)
+
+    def test_aggregator_search_skips_duplicate_global_aggregators(self):
+        opt = {
+            "feature": "gray-sift",
+            "image_size": {"height": 64, "width": 64},
+            "sampling_method": "dense",
+            "sampling_step": 16,
+            "sampling_window": 16,
+            "aggregator": ["global_avg", "bag_of_words"],
+            "complexity": [4, 8, 16],
+            "method": "by_classifier",
+        }
+        search = OutlierDetectorAggregatorSearch(opt, {"0": 0})
+        search.new()
+        self.assertEqual(len(search.aggregator_list), 4)
+        self.assertEqual(sum(agg.opt["aggregator"] == "global_avg" for agg in search.aggregator_list), 1)
+
+    def test_outlier_detector_search(self):
+        opt = {
+            "feature": ["gray-sift", "rgb-sift"],
+            "image_size": {"height": 64, "width": 64},
+            "sampling_method": "dense",
+            "sampling_step": 16,
+            "sampling_window": 16,
+            "aggregator": ["global_avg", "bag_of_words"],
+            "complexity": 4,
+            "method": "by_distance",
+        }
+        search = OutlierDetectorSearch(opt, {"0": 0})
+        with patch('handcrafted_image_representations.machine_learning.feature_extractor.tqdm', notqdm):
+            with patch('builtins.print'):
+                score = search.fit(self.model_path, "./tests/test_data", "./tests/test_data", "cls")
+        self.assertGreaterEqual(score, 0)
+        self.assertTrue(os.path.isfile(os.path.join(self.model_path, "outlier_detector_opt.json")))
+
+        detector = OutlierDetector()
+        detector.load(self.model_path)
+        results_path = os.path.join(self.model_path, "results")
+        os.makedirs(results_path)
+        with patch('handcrafted_image_representations.machine_learning.feature_extractor.tqdm', notqdm):
+            with patch('builtins.print'):
+                # the few test images do not always yield a threshold, split at the median score instead
+                with patch(
+                    'handcrafted_image_representations.machine_learning.outlier_detector.get_best_threshold',
+                    lambda score, status: np.median(score),
+                ):
+                    detector.evaluate("./tests/test_data", "cls", results_path)
+        self.assertTrue(os.path.isfile(os.path.join(results_path, "outlier_report.txt")))
+
+        opt["search"] = "halving"
+        search = OutlierDetectorSearch(opt, {"0": 0})
+        with patch('handcrafted_image_representations.machine_learning.feature_extractor.tqdm', notqdm):
+            with patch('builtins.print'):
+                score = search.fit(self.model_path, "./tests/test_data", "./tests/test_data", "cls")
+        self.assertGreaterEqual(score, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()